@@ -7,6 +7,12 @@ import requests
 from datetime import datetime
 from math import *
 import numpy as np
+import argparse
+import os
+import sys
+from profiling import PipelineMetrics, profile_run
+
+TLE_URL = "https://celestrak.org/NORAD/elements/gp.php?GROUP=starlink&FORMAT=tle"
 
 # Function to calculate distance using haversine formula
 def haversine(lon1, lat1, lon2, lat2):
@@ -70,19 +76,15 @@ def fetch_tle_data(url):
 def calculate_rms(predicted, observed):
     return np.sqrt(np.mean((np.array(predicted) - np.array(observed))**2))
 
-# Function to calculate satellite positions and RMS
-def calculate_positions_and_rms(tle_data):
-    ts = load.timescale()
-
-    # Current datetime
-    t = ts.now()
+# Function to build a skyfield satellite object for each TLE entry
+def build_satellites(tle_data, ts):
+    return [EarthSatellite(line1, line2, name, ts) for name, line1, line2 in tle_data]
 
+# Function to propagate the satellites to time t and calculate their RMS
+def propagate_satellites(satellites, t):
     satellite_data = []
 
-    # Calculate positions and RMS for each satellite
-    for name, line1, line2 in tle_data:
-        satellite = EarthSatellite(line1, line2, name, ts)
-
+    for satellite in satellites:
         # Get the geocentric position
         geocentric = satellite.at(t)
         subpoint = geocentric.subpoint()
@@ -97,7 +99,7 @@ def calculate_positions_and_rms(tle_data):
 
         # Add satellite details to the list
         satellite_data.append({
-            "OBJECT_NAME": name, 
+            "OBJECT_NAME": satellite.name, 
             "LATITUDE": subpoint.latitude.degrees, 
             "LONGITUDE": subpoint.longitude.degrees, 
             "RMS": rms
@@ -105,6 +107,16 @@ def calculate_positions_and_rms(tle_data):
 
     return satellite_data
 
+# Function to calculate satellite positions and RMS
+def calculate_positions_and_rms(tle_data):
+    ts = load.timescale()
+
+    # Current datetime
+    t = ts.now()
+
+    satellites = build_satellites(tle_data, ts)
+    return propagate_satellites(satellites, t)
+
 # Function to filter satellites within a certain radius
 def filter_satellites_within_radius(satellite_data, input_lat, input_lon, input_radius):
     filtered_satellites = []
@@ -124,10 +136,12 @@ def filter_satellites_within_radius(satellite_data, input_lat, input_lon, input_
 
 
 # Function to show the satellites on a map
-def show_map(satellites, input_lat, input_lon, input_radius):
+def show_map(satellites, input_lat, input_lon, input_radius, open_browser=True):
     # Check if the list is empty
     if not satellites:
-        print("No satellites found within the specified radius.")
+        # Headless runs keep stdout for the metrics JSON
+        print("No satellites found within the specified radius.",
+              file=sys.stdout if open_browser else sys.stderr)
         return
 
     # Create a map centered at the user-specified location
@@ -147,58 +161,109 @@ def show_map(satellites, input_lat, input_lon, input_radius):
     m.save("map.html")
 
     # Open the HTML file in a web browser
-    webbrowser.open("map.html")
+    if open_browser:
+        webbrowser.open("map.html")
 
 
 
-# Function to handle the TLE data URL input and display drones on the map
-def on_submit():
-    # Get the input point coordinates
-    lat = float(lat_entry.get())
-    lon = float(lon_entry.get())
+# Function to run the whole pipeline for a location and radius, timing each stage
+def run_pipeline(lat, lon, radius, open_browser=True):
+    metrics = PipelineMetrics()
 
-    # Get the radius input
-    radius = float(radius_entry.get())
+    with profile_run(os.environ.get("STARLINK_PROFILE")), metrics.run():
+        # Fetch TLE data from the given URL
+        with metrics.stage("fetch") as stage:
+            tle_data = fetch_tle_data(TLE_URL)
+            stage["items"] = len(tle_data)
 
-    # Fetch TLE data from the given URL
-    tle_data = fetch_tle_data("https://celestrak.org/NORAD/elements/gp.php?GROUP=starlink&FORMAT=tle")
+        # Load the timescale and take the current time
+        with metrics.stage("setup"):
+            ts = load.timescale()
+            t = ts.now()
 
-    # Calculate satellite positions and RMS
-    satellite_data = calculate_positions_and_rms(tle_data)
+        # Build the satellites from the TLE data
+        with metrics.stage("construct") as stage:
+            satellites = build_satellites(tle_data, ts)
+            stage["items"] = len(satellites)
 
-    # Filter satellites within the specified radius
-    filtered_satellites = filter_satellites_within_radius(satellite_data, lat, lon, radius)
+        # Calculate satellite positions and RMS
+        with metrics.stage("propagate") as stage:
+            satellite_data = propagate_satellites(satellites, t)
+            stage["items"] = len(satellite_data)
 
-    # Display the filtered satellites on a map
-    show_map(filtered_satellites, lat, lon, radius)
+        # Filter satellites within the specified radius
+        with metrics.stage("filter") as stage:
+            filtered_satellites = filter_satellites_within_radius(satellite_data, lat, lon, radius)
+            stage["items"] = len(filtered_satellites)
 
+        # Display the filtered satellites on a map
+        with metrics.stage("render") as stage:
+            show_map(filtered_satellites, lat, lon, radius, open_browser)
+            stage["items"] = len(filtered_satellites)
 
-# Create the GUI window
-window = tk.Tk()
-window.title("Object Filter")
-window.geometry("400x200")
+    # Export the stage metrics if requested
+    if os.environ.get("STARLINK_METRICS_JSON"):
+        metrics.write_json(os.environ["STARLINK_METRICS_JSON"])
+    if os.environ.get("STARLINK_METRICS_PROM"):
+        metrics.write_prometheus(os.environ["STARLINK_METRICS_PROM"])
 
-# Latitude input
-lat_label = tk.Label(window, text="Latitude:")
-lat_label.pack()
-lat_entry = tk.Entry(window)
-lat_entry.pack()
+    return filtered_satellites, metrics
 
-# Longitude input
-lon_label = tk.Label(window, text="Longitude:")
-lon_label.pack()
-lon_entry = tk.Entry(window)
-lon_entry.pack()
 
-# Radius input
-radius_label = tk.Label(window, text="Radius (km):")
-radius_label.pack()
-radius_entry = tk.Entry(window)
-radius_entry.pack()
+# Function to handle the TLE data URL input and display drones on the map
+def on_submit():
+    # Get the input point coordinates
+    lat = float(lat_entry.get())
+    lon = float(lon_entry.get())
 
-# Submit button
-submit_button = tk.Button(window, text="Submit", command=on_submit)
-submit_button.pack()
+    # Get the radius input
+    radius = float(radius_entry.get())
 
-# Run the GUI event loop
-window.mainloop()
+    run_pipeline(lat, lon, radius)
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(
+        description="Show Starlink satellites within a radius. Without arguments the GUI is opened.")
+    parser.add_argument("location", nargs="*", type=float, metavar="LAT LON RADIUS",
+                        help="run headless and print the stage metrics as JSON")
+    args = parser.parse_args()
+
+    # Headless run: python main.py <lat> <lon> <radius>
+    if args.location:
+        if len(args.location) != 3:
+            parser.error("headless mode needs exactly three values: LAT LON RADIUS")
+        lat, lon, radius = args.location
+        _, metrics = run_pipeline(lat, lon, radius, open_browser=False)
+        print(metrics.to_json())
+        sys.exit(0)
+
+    # Create the GUI window
+    window = tk.Tk()
+    window.title("Object Filter")
+    window.geometry("400x200")
+
+    # Latitude input
+    lat_label = tk.Label(window, text="Latitude:")
+    lat_label.pack()
+    lat_entry = tk.Entry(window)
+    lat_entry.pack()
+
+    # Longitude input
+    lon_label = tk.Label(window, text="Longitude:")
+    lon_label.pack()
+    lon_entry = tk.Entry(window)
+    lon_entry.pack()
+
+    # Radius input
+    radius_label = tk.Label(window, text="Radius (km):")
+    radius_label.pack()
+    radius_entry = tk.Entry(window)
+    radius_entry.pack()
+
+    # Submit button
+    submit_button = tk.Button(window, text="Submit", command=on_submit)
+    submit_button.pack()
+
+    # Run the GUI event loop
+    window.mainloop()
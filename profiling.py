@@ -0,0 +1,157 @@
+import cProfile
+import json
+import os
+import pstats
+import sys
+import time
+import tracemalloc
+from contextlib import contextmanager
+
+# resource is only available on Unix, peak RSS is reported as None elsewhere
+try:
+    import resource
+except ImportError:
+    resource = None
+
+
+# Function to read the peak resident memory of the process in bytes
+def peak_rss_bytes():
+    if resource is None:
+        return None
+    peak = resource.getrusage(resource.RUSAGE_SELF).ru_maxrss
+    # Linux reports kilobytes, macOS reports bytes
+    if os.uname().sysname == "Darwin":
+        return peak
+    return peak * 1024
+
+
+# Class to collect wall time, item counts and peak memory for each pipeline stage
+class PipelineMetrics:
+    def __init__(self):
+        self.stages = []
+        self.wall_seconds = None
+        self.process_peak_rss_bytes = None
+
+    # Context manager to time the whole pipeline, including work between stages
+    @contextmanager
+    def run(self):
+        start = time.perf_counter()
+        try:
+            yield self
+        finally:
+            self.wall_seconds = time.perf_counter() - start
+            self.process_peak_rss_bytes = peak_rss_bytes()
+
+    # Context manager to time one stage, set record["items"] inside the block
+    @contextmanager
+    def stage(self, name):
+        record = {"stage": name, "wall_seconds": 0.0, "items": None,
+                  "peak_memory_bytes": None}
+        # Per-stage peak memory needs tracemalloc, which is only running
+        # under profile_run, so it stays None in the default path
+        tracing = tracemalloc.is_tracing()
+        if tracing:
+            tracemalloc.reset_peak()
+        start = time.perf_counter()
+        try:
+            yield record
+        finally:
+            record["wall_seconds"] = time.perf_counter() - start
+            if tracing:
+                record["peak_memory_bytes"] = tracemalloc.get_traced_memory()[1]
+            self.stages.append(record)
+
+    def to_dict(self):
+        return {"stages": self.stages, "total_seconds": self.wall_seconds,
+                "process_peak_rss_bytes": self.process_peak_rss_bytes}
+
+    def to_json(self):
+        return json.dumps(self.to_dict(), indent=2)
+
+    # Function to render the metrics in the Prometheus text exposition format
+    def to_prometheus(self):
+        lines = [
+            "# HELP starlink_stage_wall_seconds Wall time spent in a pipeline stage.",
+            "# TYPE starlink_stage_wall_seconds gauge",
+        ]
+        for record in self.stages:
+            lines.append(f'starlink_stage_wall_seconds{{stage="{record["stage"]}"}} '
+                         f'{record["wall_seconds"]:.6f}')
+
+        lines.append("# HELP starlink_stage_items Number of items produced by a pipeline stage.")
+        lines.append("# TYPE starlink_stage_items gauge")
+        for record in self.stages:
+            if record["items"] is not None:
+                lines.append(f'starlink_stage_items{{stage="{record["stage"]}"}} {record["items"]}')
+
+        traced = [record for record in self.stages if record["peak_memory_bytes"] is not None]
+        if traced:
+            lines.append("# HELP starlink_stage_peak_memory_bytes Peak Python heap memory "
+                         "traced by tracemalloc during a pipeline stage.")
+            lines.append("# TYPE starlink_stage_peak_memory_bytes gauge")
+            for record in traced:
+                lines.append(f'starlink_stage_peak_memory_bytes{{stage="{record["stage"]}"}} '
+                             f'{record["peak_memory_bytes"]}')
+
+        if self.wall_seconds is not None:
+            lines.append("# HELP starlink_pipeline_wall_seconds Total wall time of the pipeline.")
+            lines.append("# TYPE starlink_pipeline_wall_seconds gauge")
+            lines.append(f"starlink_pipeline_wall_seconds {self.wall_seconds:.6f}")
+
+        if self.process_peak_rss_bytes is not None:
+            lines.append("# HELP starlink_process_peak_rss_bytes Highest resident memory "
+                         "of the process since it started.")
+            lines.append("# TYPE starlink_process_peak_rss_bytes gauge")
+            lines.append(f"starlink_process_peak_rss_bytes {self.process_peak_rss_bytes}")
+        return "\n".join(lines) + "\n"
+
+    def write_json(self, path):
+        _write_atomically(path, self.to_json())
+
+    # The node_exporter textfile collector may read the file at any time,
+    # so it is written to a temporary file and renamed into place
+    def write_prometheus(self, path):
+        _write_atomically(path, self.to_prometheus())
+
+
+def _write_atomically(path, text):
+    tmp_path = f"{path}.tmp"
+    with open(tmp_path, "w") as f:
+        f.write(text)
+    os.replace(tmp_path, path)
+
+
+# Context manager to dump a cProfile and tracemalloc profile of a single run.
+# When path is None nothing is started, so the disabled cost is one check.
+@contextmanager
+def profile_run(path):
+    if not path:
+        yield
+        return
+
+    profiler = cProfile.Profile()
+    started_tracing = not tracemalloc.is_tracing()
+    if started_tracing:
+        tracemalloc.start()
+    profiler.enable()
+    try:
+        yield
+    finally:
+        profiler.disable()
+        snapshot = tracemalloc.take_snapshot()
+        if started_tracing:
+            tracemalloc.stop()
+
+        # A failed dump is only reported, it must not replace the result
+        # or the exception of the profiled run
+        try:
+            # Binary stats for snakeviz / pstats, plus a readable summary
+            profiler.dump_stats(f"{path}.prof")
+            with open(f"{path}.txt", "w") as f:
+                stats = pstats.Stats(profiler, stream=f)
+                stats.sort_stats("cumulative").print_stats(30)
+                f.write("\nTop memory allocations:\n")
+                for stat in snapshot.statistics("lineno")[:20]:
+                    f.write(f"{stat}\n")
+        except Exception as e:
+            print(f"Could not write profile to {path}: {e}", file=sys.stderr)